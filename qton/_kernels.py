@@ -0,0 +1,174 @@
+'''
+Compiled kernels for acting gates on the state vector.
+
+The kernels are compiled by Numba if it is installed.  Each kernel updates
+the state in place, with the amplitudes it touches located by bit masks.
+Without Numba, HAS_NUMBA is False and Circuit uses its NumPy implementation.
+
+The state is stored as two float arrays, the real part and the imaginary 
+part, and so are the gates.  Complex products are written out in real 
+arithmetic, which the compiler can vectorize without shuffling the real and 
+imaginary lanes of a complex array.
+
+The general gates use Gauss's trick to multiply by three real products 
+instead of four.  For a gate entry c+di and an amplitude a+bi, 
+
+    k = c(a+b),    re = k - (c+d)b,    im = k + (d-c)a,
+
+and a+b is shared by all entries in the same column.  So the gate is passed 
+as three tables op_r = c, op_d = d-c and op_s = c+d.
+
+The basis convention is same as Circuit, the 0th qubit is the leftmost bit of
+a basis index, so qubit q corresponds to the bit (n-1-q).
+'''
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def apply_1q(state_r, state_i, op_r, op_d, op_s, t, n):
+        '''Act a 2 by 2 gate on qubit t of an n-qubit state in place.'''
+        stride = 1 << (n-1-t)
+        mask = stride - 1
+        for p in prange(1 << (n-1)):
+            i0 = ((p & ~mask) << 1) | (p & mask)
+            i1 = i0 | stride
+            ar = state_r[i0]
+            ai = state_i[i0]
+            br = state_r[i1]
+            bi = state_i[i1]
+            sa = ar + ai
+            sb = br + bi
+            ka = op_r[0, 0] * sa
+            kb = op_r[0, 1] * sb
+            state_r[i0] = ka - op_s[0, 0]*ai + kb - op_s[0, 1]*bi
+            state_i[i0] = ka + op_d[0, 0]*ar + kb + op_d[0, 1]*br
+            ka = op_r[1, 0] * sa
+            kb = op_r[1, 1] * sb
+            state_r[i1] = ka - op_s[1, 0]*ai + kb - op_s[1, 1]*bi
+            state_i[i1] = ka + op_d[1, 0]*ar + kb + op_d[1, 1]*br
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def apply_2q(state_r, state_i, op_r, op_d, op_s, c, t, n):
+        '''Act a 4 by 4 gate on qubits (c, t) of an n-qubit state in place.'''
+        sc = 1 << (n-1-c)
+        st = 1 << (n-1-t)
+        lo = min(sc, st)
+        hi = max(sc, st)
+        for p in prange(1 << (n-2)):
+            # insert a zero bit at the two qubit positions.
+            i00 = ((p & ~(lo-1)) << 1) | (p & (lo-1))
+            i00 = ((i00 & ~(hi-1)) << 1) | (i00 & (hi-1))
+            idx = (i00, i00 | st, i00 | sc, i00 | sc | st)
+            xr = (state_r[idx[0]], state_r[idx[1]], 
+                state_r[idx[2]], state_r[idx[3]])
+            xi = (state_i[idx[0]], state_i[idx[1]], 
+                state_i[idx[2]], state_i[idx[3]])
+            xs = (xr[0] + xi[0], xr[1] + xi[1], xr[2] + xi[2], xr[3] + xi[3])
+            for row in range(4):
+                yr = 0.0
+                yi = 0.0
+                for col in range(4):
+                    k = op_r[row, col] * xs[col]
+                    yr += k - op_s[row, col]*xi[col]
+                    yi += k + op_d[row, col]*xr[col]
+                state_r[idx[row]] = yr
+                state_i[idx[row]] = yi
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def apply_diag_1q(state_r, state_i, d_r, d_i, t, n):
+        '''Multiply the phases of a diagonal gate on qubit t in place.
+
+        Amplitudes with a unit phase are not touched.
+        '''
+        stride = 1 << (n-1-t)
+        mask = stride - 1
+        unit = (d_r == 1.0) & (d_i == 0.0)
+        for p in prange(1 << (n-1)):
+            i0 = ((p & ~mask) << 1) | (p & mask)
+            for k in range(2):
+                if unit[k]:
+                    continue
+                i = i0 | (stride * k)
+                ar = state_r[i]
+                ai = state_i[i]
+                state_r[i] = d_r[k]*ar - d_i[k]*ai
+                state_i[i] = d_r[k]*ai + d_i[k]*ar
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def apply_diag_2q(state_r, state_i, d_r, d_i, c, t, n):
+        '''Multiply the phases of a diagonal gate on qubits (c, t) in place.
+
+        Amplitudes with a unit phase are not touched, so CZ only negates the
+        |11> subspace.
+        '''
+        sc = 1 << (n-1-c)
+        st = 1 << (n-1-t)
+        lo = min(sc, st)
+        hi = max(sc, st)
+        unit = (d_r == 1.0) & (d_i == 0.0)
+        for p in prange(1 << (n-2)):
+            i00 = ((p & ~(lo-1)) << 1) | (p & (lo-1))
+            i00 = ((i00 & ~(hi-1)) << 1) | (i00 & (hi-1))
+            for k in range(4):
+                if unit[k]:
+                    continue
+                i = i00 | (sc * (k >> 1)) | (st * (k & 1))
+                ar = state_r[i]
+                ai = state_i[i]
+                state_r[i] = d_r[k]*ar - d_i[k]*ai
+                state_i[i] = d_r[k]*ai + d_i[k]*ar
+
+    @njit(parallel=True, cache=True)
+    def apply_x(state_r, state_i, t, n):
+        '''Flip qubit t by exchanging amplitude pairs in place.'''
+        stride = 1 << (n-1-t)
+        mask = stride - 1
+        for p in prange(1 << (n-1)):
+            i0 = ((p & ~mask) << 1) | (p & mask)
+            i1 = i0 | stride
+            state_r[i0], state_r[i1] = state_r[i1], state_r[i0]
+            state_i[i0], state_i[i1] = state_i[i1], state_i[i0]
+
+    @njit(parallel=True, cache=True)
+    def apply_cx(state_r, state_i, c, t, n):
+        '''Flip qubit t where qubit c is |1>, by exchanging amplitudes.'''
+        sc = 1 << (n-1-c)
+        st = 1 << (n-1-t)
+        lo = min(sc, st)
+        hi = max(sc, st)
+        for p in prange(1 << (n-2)):
+            i10 = ((p & ~(lo-1)) << 1) | (p & (lo-1))
+            i10 = (((i10 & ~(hi-1)) << 1) | (i10 & (hi-1))) | sc
+            i11 = i10 | st
+            state_r[i10], state_r[i11] = state_r[i11], state_r[i10]
+            state_i[i10], state_i[i11] = state_i[i11], state_i[i10]
+
+    @njit(parallel=True, cache=True)
+    def apply_swap(state_r, state_i, q1, q2, n):
+        '''Swap qubits q1 and q2 by exchanging amplitudes in place.
+
+        Only the bases with b[q1] != b[q2] move, so 2^(n-2) pairs are touched.
+        '''
+        s1 = 1 << (n-1-q1)
+        s2 = 1 << (n-1-q2)
+        lo = min(s1, s2)
+        hi = max(s1, s2)
+        for p in prange(1 << (n-2)):
+            i00 = ((p & ~(lo-1)) << 1) | (p & (lo-1))
+            i00 = ((i00 & ~(hi-1)) << 1) | (i00 & (hi-1))
+            i01 = i00 | s2
+            i10 = i00 | s1
+            state_r[i01], state_r[i10] = state_r[i10], state_r[i01]
+            state_i[i01], state_i[i10] = state_i[i10], state_i[i01]
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def probabilities(state_r, state_i, out):
+        '''Write the probability of every basis into out.'''
+        for i in prange(state_r.size):
+            out[i] = state_r[i]*state_r[i] + state_i[i]*state_i[i]
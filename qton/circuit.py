@@ -4,10 +4,41 @@ Class for quantum circuit model.
 
 __all__ = ['Circuit']
 
-from numpy import array, zeros, abs, matmul, conj, arange
-from numpy.random import choice
+from functools import reduce
+
+import numpy
+from numpy import asarray, empty, copyto, dtype, uint8, matmul, \
+    ascontiguousarray
 
 from .gate import *
+from . import _kernels
+
+def _aligned_empty(size, dt=complex, align=64):
+    '''Allocate an uninitialized 1 dimensin array aligned to align bytes.
+
+    The default 64-byte alignment matches the widest SIMD registers, so the 
+    gate kernels never split a load or store across cache lines.
+    '''
+    nbytes = size * dtype(dt).itemsize
+    buf = empty(nbytes + align, uint8)
+    offset = -buf.ctypes.data % align
+    return buf[offset : offset+nbytes].view(dt)
+
+def _aligned_array(vector, dt=complex):
+    '''Copy a vector or a tensor into a new aligned 1 dimensin array.'''
+    vector = asarray(vector)
+    new = _aligned_empty(vector.size, dt)
+    copyto(new.reshape(vector.shape), vector)
+    return new
+
+def _gauss_form(op):
+    '''Split a gate into the three real tables taken by the compiled kernels.
+
+    For each entry c+di, the tables hold c, d-c and c+d.  See _kernels.
+    '''
+    op_r = ascontiguousarray(op.real)
+    op_i = op.imag
+    return op_r, op_i - op_r, op_r + op_i
 
 class Circuit(object):
     '''Class for simulating a quantum computer.
@@ -29,27 +60,134 @@ class Circuit(object):
             cir.state
         To return a measurement:
             observe = cir.measure()
+        To keep the state on a GPU, with CuPy installed:
+            cir = Circuit(number_of_qubits, backend='cupy')
     '''
+
+    # gates on the last qubits are flushed in tiles of 2**14 amplitudes, 
+    # 256 KB, which fits in the L2 cache of most CPUs.
+    _block_bits = 14
     
-    def __init__(self, number_of_qubits):
+    def __init__(self, number_of_qubits, backend='numpy'):
         '''Create a circuit object. 
 
         By default, the sate starts with all qubits are up under Z basis.
 
+        With backend 'cupy', the state is a cupy.ndarray living on the GPU.  
+        CuPy shares the NumPy interface, so the same NumPy implementation of 
+        every gate runs there.  The compiled kernels are only for 'numpy'.
+
         -IN:
             number_of_qubits --- number of qubits in the circuit.
                 type: integer
+            backend --- array library holding the state, 'numpy' or 'cupy'.
+                type: string
 
         -INFLUENCED:
             self.number_of_qubits --- number of qubits in the circuit.
                 type: integer
+            self.backend --- array library holding the state.
+                type: string
             self.state --- state of the circuit.
                 type: 1 dimensin numpy.array of complex.
         '''
+        if backend == 'numpy':
+            self._xp = numpy
+        elif backend == 'cupy':
+            import cupy
+            self._xp = cupy
+        else:
+            raise ValueError('unknown backend %r' % backend)
+        self.backend = backend
+        self._compiled = _kernels.HAS_NUMBA and backend == 'numpy'
+
         self.number_of_qubits = number_of_qubits
-        self.state = zeros(2**number_of_qubits, complex)
-        self.state[0] = 1.0
+        self._pending = {}
+        self._prob_buf = None    # allocated by the first measure().
+        self._state_r = self._state_i = None
+        if self._xp is numpy:
+            self._state = _aligned_empty(2**number_of_qubits)
+            self._state[:] = 0.0
+        else:
+            self._state = self._xp.zeros(2**number_of_qubits, complex)
+        self._state[0] = 1.0
         return None
+
+    def _new_state(self, vector):
+        '''Copy a vector or a tensor into a new state array.
+
+        The array is aligned for NumPy, and lives on the GPU for CuPy.  This 
+        is an internal function.
+
+        -IN:
+            vector --- amplitudes of the state, in any shape.
+                type: numpy.array or cupy.ndarray
+
+        -RETURN:
+            --- a new state.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if self._xp is numpy:
+            return _aligned_array(vector)
+        return self._xp.array(vector, complex, order='C').ravel()
+
+    @property
+    def state(self):
+        '''State of the circuit.
+
+        Single-qubit gates are applied lazily, so any pending gate is flushed 
+        before the state is returned.
+
+        -RETURN:
+            --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        self._flush()
+        return self._merge()
+
+    @state.setter
+    def state(self, vector):
+        # the vector is copied into a new aligned complex state, so the 
+        # in-place gate paths can write to it.
+        vector = self._new_state(vector)
+        if vector.size != 2**self.number_of_qubits:
+            raise ValueError('expect a state of %d amplitudes, got %d' 
+                % (2**self.number_of_qubits, vector.size))
+        self._pending = {}    # a new state overrides the pending gates.
+        self._state = vector
+        self._state_r = self._state_i = None
+
+    def _split(self):
+        '''Store the state as its real and imaginary parts.
+
+        This is the layout used by the compiled kernels.  It is an internal 
+        function, and self._state is invalid until _merge() is called.
+
+        -RETURN:
+            --- real and imaginary parts of the state.
+                type: tuple of two 1 dimensin numpy.array of float.
+        '''
+        if self._state is not None:
+            self._state_r = _aligned_array(self._state.real, float)
+            self._state_i = _aligned_array(self._state.imag, float)
+            self._state = None
+        return self._state_r, self._state_i
+
+    def _merge(self):
+        '''Store the state as a complex array again.
+
+        This is an internal function, the inverse of _split().
+
+        -RETURN:
+            --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if self._state is None:
+            self._state = _aligned_empty(self._state_r.size)
+            self._state.real = self._state_r
+            self._state.imag = self._state_i
+            self._state_r = self._state_i = None
+        return self._state
     
     def initialize(self, vector):
         '''Initialize the circuit state with a given vector.
@@ -64,10 +202,37 @@ class Circuit(object):
             self.state --- state of the circuit.
                 type: 1 dimensin numpy.array of complex.
         '''
-        self.state = array(vector, complex)
+        self.state = vector
+        return None
+
+    def initialize_product(self, vectors):
+        '''Initialize the circuit state with a product of single-qubit states.
+
+        The state is the Kronecker product of the given vectors, the 0th one 
+        for the 0th qubit.  Each vector must be normalized already.  This 
+        saves building the full state vector by hand.
+
+        -IN:
+            vectors --- a normalized state for each qubit.
+                type: sequence of numpy.array of 2 complex.
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if len(vectors) != self.number_of_qubits:
+            raise ValueError('expect %d single-qubit states, got %d' 
+                % (self.number_of_qubits, len(vectors)))
+        xp = self._xp
+        vectors = [xp.asarray(v, complex) for v in vectors]
+        for v in vectors:
+            if v.shape != (2,):
+                raise ValueError('expect a single-qubit state of 2 '
+                    'amplitudes, got shape %r' % (v.shape,))
+        self.state = reduce(xp.kron, vectors)
         return None
                                     
-    def measure(self):
+    def measure(self, shots=1):
         '''Do a measurement on the circuit. 
 
         This returns a certain basis' ID number according to the probability 
@@ -78,16 +243,40 @@ class Circuit(object):
         means the basis |01> on a two-qubit circuit.
 
         To simplify the simulation, this measurement leaves the circuit state
-        unaffected.
+        unaffected.  So it can be repeated for many shots, which share one 
+        cumulative distribution and are sampled together by a binary search.
+        The distribution is computed in a buffer kept for later measurements.
 
-        -RETURN:
-            --- basis ID.
+        -IN:
+            shots --- number of measurements.
                 type: integer
+
+        -RETURN:
+            --- basis ID, or an array of basis IDs if shots is not 1.
+                type: integer or 1 dimensin numpy.array of integer.
         '''
-        prob = zeros(2**self.number_of_qubits)
-        for i in range(2**self.number_of_qubits):
-            prob[i] = abs(self.state[i])**2
-        return choice(arange(2**self.number_of_qubits), p = prob)
+        xp = self._xp
+        self._flush()
+        if self._prob_buf is None:
+            size = 2**self.number_of_qubits
+            if xp is numpy:
+                self._prob_buf = _aligned_empty(size, float)
+            else:
+                self._prob_buf = xp.empty(size)
+        cdf = self._prob_buf
+        if self._state is None:
+            _kernels.probabilities(self._state_r, self._state_i, cdf)
+        else:
+            xp.abs(self._state, out=cdf)
+            xp.square(cdf, out=cdf)
+        xp.cumsum(cdf, out=cdf)
+        if not cdf[-1] > 0:
+            raise ValueError('the state has no nonzero amplitude to measure')
+        ids = xp.searchsorted(cdf, xp.random.random(shots) * cdf[-1], 
+            side='right')
+        if shots == 1: return int(ids[0])
+        if xp is not numpy: return xp.asnumpy(ids)
+        return ids
 
     def swap(self, q1, q2):
         '''Swap any two qubits in the circuit. 
@@ -105,6 +294,11 @@ class Circuit(object):
         
             |...b[q2]...b[q1]...>
 
+        which is the same as exchanging the two corresponding axes once the 
+        state is viewed as a tensor of shape (2, 2, ..., 2).  The compiled 
+        kernel exchanges them in place instead, with bit masks locating the 
+        bases, if Numba is installed.
+
         -IN:
             q1 --- the index of the qubit to swap.
                 type: integer
@@ -115,27 +309,218 @@ class Circuit(object):
             self.state --- state of the circuit.
                 type: 1 dimensin numpy.array of complex.
         '''
+        self._check_qubits(q1)
+        self._check_qubits(q2)
         if q1 == q2: return None
-        old_state = self.state.copy()
-        form = '0%db' % self.number_of_qubits
-        for i in range(2**self.number_of_qubits):
-            bit_string = format(i, form)
-            if bit_string[q1] != bit_string[q2]:
-                bit_list = list(bit_string)
-                tmp = bit_list[q1]  # Switch the value by tmp.
-                bit_list[q1] = bit_list[q2]
-                bit_list[q2] = tmp
-                j = int(''.join(bit_list), 2)
-                self.state[i] = old_state[j]
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_swap(state_r, state_i, q1, q2, 
+                self.number_of_qubits)
+        else:
+            psi = self._state.reshape((2,) * self.number_of_qubits)
+            self._state = self._new_state(psi.swapaxes(q1, q2))
+
+        # pending gates of the two qubits are relabelled instead of flushed.
+        op1 = self._pending.pop(q1, None)
+        op2 = self._pending.pop(q2, None)
+        if op1 is not None: self._pending[q2] = op1
+        if op2 is not None: self._pending[q1] = op2
         return None
         
+    def _check_qubits(self, *qubits):
+        '''Check the qubit indices of an operation.
+
+        The compiled kernels do no bounds check, so every index is checked 
+        here before any gate is queued or applied.
+
+        This is an internal function.
+
+        -IN:
+            qubits --- indices of the qubits an operation acts on.
+                type: integers
+
+        -RAISE:
+            IndexError --- if an index is not in [0, number_of_qubits).
+            ValueError --- if two indices are same.
+        '''
+        for q in qubits:
+            if not 0 <= q < self.number_of_qubits:
+                raise IndexError('qubit %r is out of range for %d qubits' 
+                    % (q, self.number_of_qubits))
+        if len(set(qubits)) != len(qubits):
+            raise ValueError('qubits %r must be different' % (qubits,))
+        return None
+
+    def _flush(self, targ=None):
+        '''Apply the pending single-qubit gates to the state.
+
+        The target could be a sequence of qubit indices.  By default, pending 
+        gates on all qubits are flushed.
+
+        This is an internal function.
+
+        -IN:
+            targ --- index of the qubit to flush.
+                type: None, integer or sequence of integers.
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if targ is None:
+            targ = list(self._pending)
+        elif type(targ) is int:
+            targ = [targ]
+        gates = [(i, self._pending.pop(i)) for i in targ if i in self._pending]
+
+        # gates on the last qubits never cross a tile, so they can be blocked.
+        low = self.number_of_qubits - self._block_bits
+        blocked = [(i, op) for i, op in gates if i >= low]
+        if self._xp is numpy and not self._compiled \
+            and low > 0 and len(blocked) > 1:
+            self._apply_blocked(blocked)
+            gates = [(i, op) for i, op in gates if i < low]
+
+        for i, op in gates:
+            self._apply_single(op, i)
+        return None
+
+    def _apply_blocked(self, gates):
+        '''Act several single-qubit gates on the state, tile by tile.
+
+        The state is cut into tiles of 2**self._block_bits amplitudes, small 
+        enough to stay in cache.  All gates are applied to one tile before 
+        moving on, so the state is read from memory once instead of once per
+        gate.  Each target must be one of the last self._block_bits qubits.
+
+        This is an internal function used by _flush() for the NumPy path.  
+        Blocking gave the compiled kernels no gain, so they still act the 
+        gates one by one.
+
+        -IN:
+            gates --- pairs of target qubit index and single-qubit gate.
+                type: list of tuple (integer, 2 by 2 numpy.array).
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        low = self.number_of_qubits - self._block_bits
+        size = 2**self._block_bits
+        for start in range(0, self._state.size, size):
+            tile = self._state[start : start+size]
+            for i, op in gates:
+                psi = tile.reshape(2**(i-low), 2, -1)
+                matmul(op, psi, out=psi)
+        return None
+
+    def _apply_single(self, op, targ):
+        '''Act a single-qubit gate on an arbitray qubit immediately. 
+
+        The state is viewed as a tensor of shape (2**targ, 2, ...), so the 
+        gate acts on the middle axis for the whole batch in one product.
+
+        This is an internal function used by _flush().  The compiled kernel 
+        is used instead if Numba is installed.  A diagonal gate is passed to 
+        _single_diag(), and a Pauli X gate only exchanges amplitudes.
+
+        -IN:
+            op --- single-qubit gate or operation.
+                type: 2 by 2 numpy.array.
+            targ --- index of the target qubit.
+                type: integer
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if op[0, 1] == 0 and op[1, 0] == 0:
+            self._single_diag(op.diagonal(), targ)
+            return None
+
+        if (op == x_gate).all():
+            self._single_x(targ)
+            return None
+
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_1q(state_r, state_i, *_gauss_form(op), targ, 
+                self.number_of_qubits)
+            return None
+
+        psi = self._state.reshape(2**targ, 2, -1)
+        if self._xp is numpy:
+            matmul(op, psi, out=psi)    # one batched product, in place.
+        else:
+            psi[...] = self._xp.matmul(self._xp.asarray(op), psi)
+        return None
+
+    def _single_diag(self, diag, targ):
+        '''Act a diagonal single-qubit gate on an arbitray qubit immediately.
+
+        The amplitudes with the target qubit in |0> and |1> are multiplied 
+        by the two phases in place, no matrix product is needed.  A unit 
+        phase is skipped.
+
+        This is an internal function used by _apply_single().
+
+        -IN:
+            diag --- diagonal of the single-qubit gate.
+                type: numpy.array of 2 complex.
+            targ --- index of the target qubit.
+                type: integer
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_diag_1q(state_r, state_i, 
+                ascontiguousarray(diag.real), ascontiguousarray(diag.imag), 
+                targ, self.number_of_qubits)
+            return None
+
+        psi = self._state.reshape(2**targ, 2, -1)
+        for k in range(2):
+            if diag[k] != 1: psi[:, k, :] *= diag[k]
+        return None
+
+    def _single_x(self, targ):
+        '''Act a Pauli X gate on an arbitray qubit immediately.
+
+        X only exchanges the amplitudes with the target qubit in |0> and |1>,
+        so no multiplication is needed.
+
+        This is an internal function used by _apply_single().
+
+        -IN:
+            targ --- index of the target qubit.
+                type: integer
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_x(state_r, state_i, targ, self.number_of_qubits)
+            return None
+
+        psi = self._state.reshape(2**targ, 2, -1)
+        psi[:, [0, 1], :] = psi[:, [1, 0], :]
+        return None
+
     def _single_gate(self, op, targ):
         '''Act a single-qubit gate on an arbitray qubit. 
 
-        The target qubit will be swapped with the last qubit before and after 
-        the action.  The target could be a sequence of qubit indices. 
+        The gate is not applied at once.  Instead, it is multiplied into the 
+        pending gate of the target qubit, and consecutive gates on the same 
+        qubit cost one pass over the state when they are flushed.  The 
+        target could be a sequence of qubit indices. 
 
-        This is an internal function based on swap() function. 
+        This is an internal function and a basic for other single qubit 
+        operation.
 
         -IN:
             op --- single-qubit gate or operation.
@@ -151,24 +536,25 @@ class Circuit(object):
             targ = [targ]
         else:
             targ = list(set(targ))
+        self._check_qubits(*targ)
 
         for i in targ:
-            # the last qubit is used as a processor.
-            self.swap(i, self.number_of_qubits-1)
-            for idx in range(0, 2**self.number_of_qubits, 2):
-                self.state[idx:idx+2] = matmul(op, self.state[idx : idx+2])
-            self.swap(i, self.number_of_qubits-1)
+            if i in self._pending:
+                self._pending[i] = matmul(op, self._pending[i])
+            else:
+                self._pending[i] = op
         return None
  
     def _double_gate(self, op, ctrl, targ):
         '''Act a two-qubit gate on two arbitray qubits. 
 
-        The two qubits are labelled as control and target. This is also based 
-        on swap() function.
+        The two qubits are labelled as control and target. 
 
-        The concept of the algorithm is to swap the two qubits with the last
-        two before and after applying the operation. The last two qubits are 
-        used as a processor. Therefore, the swap process is the key.
+        The concept of the algorithm is to view the state as a tensor of shape
+        (2, 2, ..., 2) and the gate as a tensor of shape (2, 2, 2, 2), then 
+        contract the two input legs of the gate with the control and target 
+        axes of the state.  No qubit is physically swapped.  The compiled 
+        kernel is used instead if Numba is installed.
 
         This is an internal function and a basic for other double qubit 
         operation. to reduce the complexity, ctrl and targ CANNOT be sequence
@@ -186,41 +572,102 @@ class Circuit(object):
             self.state --- state of the circuit.
                 type: 1 dimensin numpy.array of complex.
         '''
-        if ctrl == targ: 
-            raise Exception    # control and target can't be same.
-
-        # last two qubits are used as a processor or registers.
-        reg = {self.number_of_qubits-2, self.number_of_qubits-1}
-        if ctrl not in reg and targ not in reg:
-            self.swap(ctrl, self.number_of_qubits-2)
-            self.swap(targ, self.number_of_qubits-1)
-            for idx in range(0, 2**self.number_of_qubits, 4):
-                self.state[idx:idx+4] = matmul(op, self.state[idx:idx+4])
-            self.swap(targ, self.number_of_qubits-1)
-            self.swap(ctrl, self.number_of_qubits-2)
-        elif ctrl in reg and targ in reg:
-            if ctrl == self.number_of_qubits-1: self.swap(ctrl, targ)
-            for idx in range(0, 2**self.number_of_qubits, 4):
-                self.state[idx:idx+4] = matmul(op, self.state[idx:idx+4])
-            if ctrl == self.number_of_qubits-1: self.swap(ctrl, targ)
-        elif ctrl in reg and targ not in reg:
-            if ctrl == self.number_of_qubits-1: self.swap(ctrl, self.number_of_qubits-2)
-            self.swap(targ, self.number_of_qubits-1)
-            for idx in range(0,2**self.number_of_qubits,4):
-                self.state[idx:idx+4] = matmul(op, self.state[idx:idx+4])
-            self.swap(targ, self.number_of_qubits-1)
-            if ctrl == self.number_of_qubits-1: self.swap(ctrl, self.number_of_qubits-2)
-        elif ctrl not in reg and targ in reg:
-            if targ == self.number_of_qubits-2: self.swap(targ, self.number_of_qubits-1)
-            self.swap(ctrl, self.number_of_qubits-2)
-            for idx in range(0, 2**self.number_of_qubits, 4):
-                self.state[idx:idx+4] = matmul(op, self.state[idx:idx+4])
-            self.swap(ctrl, self.number_of_qubits-2)
-            if targ == self.number_of_qubits-2: self.swap(targ, self.number_of_qubits-1)    
+        self._check_qubits(ctrl, targ)
+        self._flush([ctrl, targ])
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_2q(state_r, state_i, *_gauss_form(op), ctrl, targ, 
+                self.number_of_qubits)
+            return None
+
+        xp = self._xp
+        shape = (2,) * self.number_of_qubits
+        gate = xp.asarray(op).reshape(2, 2, 2, 2)  # (out_c, out_t, in_c, in_t)
+        psi = xp.tensordot(gate, self._state.reshape(shape), 
+            axes=([2, 3], [ctrl, targ]))
+        psi = xp.moveaxis(psi, [0, 1], [ctrl, targ])
+        self._state = self._new_state(psi)
         return None   
 
+    def _double_diag(self, diag, ctrl, targ):
+        '''Act a diagonal two-qubit gate on two arbitray qubits.
+
+        The amplitudes in each of the four subspaces |00>, |01>, |10>, |11> 
+        of the control and target qubits are multiplied by the corresponding
+        phase in place, no matrix product is needed.  A unit phase is 
+        skipped, thus CZ only negates the |11> subspace.
+
+        This is an internal function and a basic for other diagonal double 
+        qubit operation.
+
+        -IN:
+            diag --- diagonal of the double-qubit gate.
+                type: numpy.array of 4 complex.
+            ctrl --- index of the control qubit.
+                type: integer
+            targ --- index of the target qubit.
+                type: integer
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        self._check_qubits(ctrl, targ)
+        self._flush([ctrl, targ])
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_diag_2q(state_r, state_i, 
+                ascontiguousarray(diag.real), ascontiguousarray(diag.imag), 
+                ctrl, targ, self.number_of_qubits)
+            return None
+
+        psi = self._state.reshape((2,) * self.number_of_qubits)
+        for k in range(4):
+            idx = [slice(None)] * self.number_of_qubits
+            idx[ctrl], idx[targ] = k >> 1, k & 1
+            if diag[k] != 1: psi[tuple(idx)] *= diag[k]
+        return None
+
+    def _double_x(self, ctrl, targ):
+        '''Act a CNOT gate on two arbitray qubits immediately.
+
+        CNOT only exchanges the amplitudes of the |10> and |11> subspaces of 
+        the control and target qubits, so no multiplication is needed.
+
+        This is an internal function used by cx().
+
+        -IN:
+            ctrl --- index of the control qubit.
+                type: integer
+            targ --- index of the target qubit.
+                type: integer
+
+        -INFLUENCED:
+            self.state --- state of the circuit.
+                type: 1 dimensin numpy.array of complex.
+        '''
+        self._check_qubits(ctrl, targ)
+        self._flush([ctrl, targ])
+        if self._compiled:
+            state_r, state_i = self._split()
+            _kernels.apply_cx(state_r, state_i, ctrl, targ, 
+                self.number_of_qubits)
+            return None
+
+        psi = self._state.reshape((2,) * self.number_of_qubits)
+        idx = [slice(None)] * self.number_of_qubits + [Ellipsis]
+        idx[ctrl], idx[targ] = 1, 0
+        psi10 = psi[tuple(idx)]    # Ellipsis keeps a view for 2 qubits.
+        idx[targ] = 1
+        psi11 = psi[tuple(idx)]
+        tmp = psi10.copy()
+        psi10[...] = psi11
+        psi11[...] = tmp
+        return None
+
 # 
-# All other operations are based on _single_gate or _double_gate functions. 
+# All other operations are based on _single_gate, _double_gate, 
+# _double_diag or _double_x functions. 
 # It's easy to add more methods in future by this way.
 # 
 
@@ -264,7 +711,7 @@ class Circuit(object):
 
         Circuit.sdg(targ)
         '''
-        self._single_gate(conj(s_gate).T, targ)
+        self._single_gate(sdg_gate, targ)
         
     def t(self, targ):
         '''pi/8 T operation.
@@ -278,7 +725,7 @@ class Circuit(object):
 
         Circuit.tdg(targ)
         '''
-        self._single_gate(conj(t_gate).T, targ)
+        self._single_gate(tdg_gate, targ)
         
     def rx(self, theta, targ):
         '''Rotation along X axis.
@@ -314,7 +761,7 @@ class Circuit(object):
 
         Circuit.cx(ctrl, targ)
         '''
-        self._double_gate(cx_gate, ctrl, targ)
+        self._double_x(ctrl, targ)
 
     def cy(self, ctrl, targ):
         '''Controlled Pauli Y operation.
@@ -328,7 +775,7 @@ class Circuit(object):
 
         Circuit.cz(ctrl, targ)
         '''
-        self._double_gate(cz_gate, ctrl, targ)
+        self._double_diag(cz_diag, ctrl, targ)
         
     def crx(self, theta, ctrl, targ):
         '''Controlled rotation along X axis.
@@ -349,4 +796,4 @@ class Circuit(object):
         
         Circuit.crz(ctrl, targ)
         '''
-        self._double_gate(crz_gate(theta), ctrl, targ)
+        self._double_diag(crz_diag(theta), ctrl, targ)
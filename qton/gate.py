@@ -2,6 +2,7 @@
 Basic quantum operations and corresponding unitaries. 
 
 Each gate is expressed as a matrix in the minimal state space it acts.
+Diagonal two-qubit gates are also given as the vector of their diagonal.
 We follow the convention in most textbooks, for example, Nielsen and Chuang's.
 '''
 
@@ -12,6 +13,8 @@ __all__ = [
     'z_gate',
     's_gate',
     't_gate',
+    'sdg_gate',
+    'tdg_gate',
     'rx_gate',
     'ry_gate',
     'rz_gate',
@@ -23,39 +26,75 @@ __all__ = [
     'crx_gate',
     'cry_gate',
     'crz_gate',
+    'cz_diag',
+    'crz_diag',
     ]
 
-from numpy import array, sqrt, sin, cos, exp
+from functools import lru_cache, wraps
+
+from numpy import array, sqrt, sin, cos, exp, conj
+
+def _cached(func):
+    '''Cache a parametric gate on its angle.
+
+    Circuits often repeat the same angle, so the matrix is built only once.  
+    The cached matrix is shared by every caller, thus it is made read-only.
+    A 0-d array or NumPy scalar angle is looked up as a plain number, and an 
+    angle that can not be hashed builds its matrix without the cache.
+    '''
+    @lru_cache(maxsize=4096)
+    def build(theta):
+        gate = func(theta)
+        gate.flags.writeable = False
+        return gate
+
+    @wraps(func)
+    def wrapper(theta):
+        if getattr(theta, 'ndim', None) == 0:
+            theta = theta.item()
+        try:
+            hash(theta)
+        except TypeError:
+            return func(theta)
+        return build(theta)
+    wrapper.cache_info = build.cache_info
+    wrapper.cache_clear = build.cache_clear
+    return wrapper
 
 # Fixed single-qubit gates.
-h_gate = array([[1, 1], [1, -1]]) * sqrt(0.5)
-x_gate = array([[0, 1], [1, 0]])
-y_gate = array([[0, -1j], [1j, 0]])
-z_gate = array([[1, 0], [0, -1]])
-s_gate = array([[1, 0], [0, 1j]])
-t_gate = array([[1, 0], [0, (1+1j) * sqrt(0.5)]])
+h_gate = array([[1, 1], [1, -1]], complex) * sqrt(0.5)
+x_gate = array([[0, 1], [1, 0]], complex)
+y_gate = array([[0, -1j], [1j, 0]], complex)
+z_gate = array([[1, 0], [0, -1]], complex)
+s_gate = array([[1, 0], [0, 1j]], complex)
+t_gate = array([[1, 0], [0, (1+1j) * sqrt(0.5)]], complex)
+sdg_gate = conj(s_gate).T.copy()
+tdg_gate = conj(t_gate).T.copy()
 
 # Single-qubit gates with parameters.
+@_cached
 def rx_gate(theta):
     t = theta * 0.50
     return array([
         [cos(t), -1j * sin(t)], 
         [-1j * sin(t), cos(t)],
-        ])
+        ], complex)
                       
+@_cached
 def ry_gate(theta):
     t = theta * 0.50
     return array([
         [cos(t), -sin(t)], 
         [sin(t),  cos(t)],
-        ])
+        ], complex)
 
+@_cached
 def rz_gate(theta):
     t = theta * 0.50
     return array([
         [exp(-1j*t), 0], 
         [0,  exp(1j*t)],
-        ])                     
+        ], complex)                     
 
 # Fixed two-qubit gates
 ch_gate = array([
@@ -63,33 +102,34 @@ ch_gate = array([
     [0, 1, 0, 0], 
     [0, 0, sqrt(0.5), sqrt(0.5)],
     [0, 0, sqrt(0.5),-sqrt(0.5)],
-    ])
+    ], complex)
 cx_gate = array([
     [1, 0, 0, 0], 
     [0, 1, 0, 0], 
     [0, 0, 0, 1], 
     [0, 0, 1, 0],
-    ])
+    ], complex)
 cy_gate = array([
     [1, 0, 0, 0], 
     [0, 1, 0, 0], 
     [0, 0, 0, -1j], 
     [0, 0, 1j, 0],
-    ])
+    ], complex)
 cz_gate = array([
     [1, 0, 0, 0], 
     [0, 1, 0, 0], 
     [0, 0, 1, 0], 
     [0, 0, 0, -1],
-    ])
+    ], complex)
 sw_gate = array([
     [1, 0, 0, 0], 
     [0, 0, 1, 0], 
     [0, 1, 0, 0], 
     [0, 0, 0, 1],
-    ])
+    ], complex)
 
 # Two-qubit gates with parameters.
+@_cached
 def crx_gate(theta):
     t = theta * 0.50
     return array([
@@ -97,8 +137,9 @@ def crx_gate(theta):
         [0, 1, 0, 0],
         [0, 0, cos(t), -1j*sin(t)], 
         [0, 0, -1j*sin(t), cos(t)],
-        ])
+        ], complex)
                       
+@_cached
 def cry_gate(theta):
     t = theta * 0.50
     return array([
@@ -106,8 +147,9 @@ def cry_gate(theta):
         [0, 1, 0, 0],
         [0, 0, cos(t), -sin(t)], 
         [0, 0, sin(t),  cos(t)],
-        ])
+        ], complex)
 
+@_cached
 def crz_gate(theta):
     t = theta * 0.50
     return array([
@@ -115,4 +157,12 @@ def crz_gate(theta):
         [0, 1, 0, 0],   
         [0, 0, exp(-1j*t), 0], 
         [0, 0, 0,  exp(1j*t)],
-        ])
\ No newline at end of file
+        ], complex)
+
+# Diagonals of diagonal two-qubit gates.
+cz_diag = array([1, 1, 1, -1], complex)
+
+@_cached
+def crz_diag(theta):
+    t = theta * 0.50
+    return array([1, 1, exp(-1j*t), exp(1j*t)], complex)
\ No newline at end of file
@@ -0,0 +1,24 @@
+import os
+import sys
+import types
+
+import numpy
+import pytest
+
+# Qton is used by placing the 'qton' folder on the path, see README.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_cupy(monkeypatch):
+    '''A stand-in 'cupy' module doing its work with NumPy on the host.
+
+    It is a different module object from numpy, so Circuit takes the 
+    branches written for the CuPy backend.
+    '''
+    cupy = types.ModuleType('cupy')
+    cupy.__dict__.update(
+        (k, v) for k, v in vars(numpy).items() if not k.startswith('__'))
+    cupy.asnumpy = numpy.asarray
+    monkeypatch.setitem(sys.modules, 'cupy', cupy)
+    return cupy
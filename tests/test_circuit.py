@@ -0,0 +1,269 @@
+'''
+Tests for the Circuit class, checked against a dense reference simulator.
+
+Each test runs on the NumPy implementation, and on the compiled kernels too
+if Numba is installed.  The tests ending in _cupy run the CuPy backend on a 
+NumPy stand-in module, see the fake_cupy fixture.
+'''
+
+import random
+
+import numpy as np
+import pytest
+
+from qton import Circuit, _kernels
+from qton import gate
+
+PATHS = [False, True] if _kernels.HAS_NUMBA else [False]
+
+
+@pytest.fixture(params=PATHS, ids=lambda c: 'numba' if c else 'numpy')
+def compiled(request):
+    return request.param
+
+
+def make(n, compiled):
+    cir = Circuit(n)
+    cir._compiled = compiled
+    return cir
+
+
+def full_single(op, t, n):
+    '''Dense 2**n by 2**n matrix of a single-qubit gate on qubit t.'''
+    m = np.eye(1)
+    for q in range(n):
+        m = np.kron(m, op if q == t else np.eye(2))
+    return m
+
+
+def full_double(op, c, t, n):
+    '''Dense 2**n by 2**n matrix of a two-qubit gate on qubits (c, t).'''
+    m = np.zeros((2**n, 2**n), complex)
+    for j in range(2**n):
+        bits = [(j >> (n-1-q)) & 1 for q in range(n)]
+        col = 2*bits[c] + bits[t]
+        for row in range(4):
+            bits[c], bits[t] = row >> 1, row & 1
+            i = sum(b << (n-1-q) for q, b in enumerate(bits))
+            m[i, j] += op[row, col]
+    return m
+
+
+SINGLES = {
+    'h': gate.h_gate, 'x': gate.x_gate, 'y': gate.y_gate, 'z': gate.z_gate,
+    's': gate.s_gate, 'sdg': gate.sdg_gate, 't': gate.t_gate,
+    'tdg': gate.tdg_gate,
+    }
+ROTATIONS = {'rx': gate.rx_gate, 'ry': gate.ry_gate, 'rz': gate.rz_gate}
+DOUBLES = {
+    'ch': gate.ch_gate, 'cx': gate.cx_gate, 'cy': gate.cy_gate,
+    'cz': gate.cz_gate, 'swap': gate.sw_gate,
+    }
+CONTROLLED_ROTATIONS = {
+    'crx': gate.crx_gate, 'cry': gate.cry_gate, 'crz': gate.crz_gate,
+    }
+
+
+def check_random_circuit(cir, n, seed):
+    '''Act 40 random gates on cir and compare with the dense reference.'''
+    rng = random.Random(seed)
+    ref = np.zeros(2**n, complex)
+    ref[0] = 1.0
+    for _ in range(40):
+        kind = rng.random()
+        if kind < 0.4 or n == 1:
+            name = rng.choice(sorted(SINGLES))
+            t = rng.randrange(n)
+            getattr(cir, name)(t)
+            ref = full_single(SINGLES[name], t, n) @ ref
+        elif kind < 0.6:
+            name = rng.choice(sorted(ROTATIONS))
+            theta, t = rng.uniform(0, 6), rng.randrange(n)
+            getattr(cir, name)(theta, t)
+            ref = full_single(ROTATIONS[name](theta), t, n) @ ref
+        elif kind < 0.85:
+            name = rng.choice(sorted(DOUBLES))
+            c, t = rng.sample(range(n), 2)
+            getattr(cir, name)(c, t)
+            ref = full_double(DOUBLES[name], c, t, n) @ ref
+        else:
+            name = rng.choice(sorted(CONTROLLED_ROTATIONS))
+            theta = rng.uniform(0, 6)
+            c, t = rng.sample(range(n), 2)
+            getattr(cir, name)(theta, c, t)
+            ref = full_double(CONTROLLED_ROTATIONS[name](theta), c, t, n) @ ref
+    assert np.allclose(cir.state, ref)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('n', [1, 2, 3, 5])
+def test_random_circuit(compiled, n, seed):
+    check_random_circuit(make(n, compiled), n, seed)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('n', [1, 2, 3, 5])
+def test_random_circuit_cupy(fake_cupy, n, seed):
+    cir = Circuit(n, backend='cupy')
+    assert cir._xp is fake_cupy and not cir._compiled
+    check_random_circuit(cir, n, seed)
+
+
+def test_blocked_flush(compiled):
+    n = 6
+    cir = make(n, compiled)
+    cir._block_bits = 3
+    ref = np.zeros(2**n, complex)
+    ref[0] = 1.0
+    for q in range(n):
+        cir.h(q)
+        cir.ry(0.3 * q, q)
+        ref = full_single(gate.ry_gate(0.3 * q) @ gate.h_gate, q, n) @ ref
+    assert np.allclose(cir.state, ref)
+
+
+def test_multiple_targets(compiled):
+    cir = make(3, compiled)
+    cir.h([0, 2])
+    ref = full_single(gate.h_gate, 0, 3) @ full_single(gate.h_gate, 2, 3)
+    assert np.allclose(cir.state, ref[:, 0])
+
+
+def check_measure(cir):
+    '''Compare the sampled frequencies with the probabilities.'''
+    cir.h(0)
+    cir.ry(1.0, 1)
+    prob = np.abs(cir.state)**2
+    counts = np.bincount(cir.measure(20000), minlength=4) / 20000
+    assert np.allclose(counts, prob, atol=0.02)
+    assert isinstance(cir.measure(), int)
+
+
+def test_measure(compiled):
+    check_measure(make(2, compiled))
+
+
+def test_measure_cupy(fake_cupy):
+    check_measure(Circuit(2, backend='cupy'))
+
+
+def test_initialize_product_cupy(fake_cupy):
+    cir = Circuit(2, backend='cupy')
+    cir.initialize_product([[0, 1], [np.sqrt(0.5), np.sqrt(0.5)]])
+    assert np.allclose(cir.state, [0, 0, np.sqrt(0.5), np.sqrt(0.5)])
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Circuit(2, backend='bogus')
+
+
+def test_initialize_product(compiled):
+    cir = make(2, compiled)
+    cir.initialize_product([[0, 1], [np.sqrt(0.5), np.sqrt(0.5)]])
+    assert np.allclose(cir.state, [0, 0, np.sqrt(0.5), np.sqrt(0.5)])
+
+
+def test_alignment(compiled):
+    cir = make(4, compiled)
+    assert cir.state.ctypes.data % 64 == 0
+    cir.h(0)
+    cir.cx(0, 3)
+    cir.swap(1, 2)
+    assert cir.state.ctypes.data % 64 == 0
+    cir.initialize(np.eye(16)[5])
+    assert cir.state.ctypes.data % 64 == 0
+    cir.measure()
+    assert cir._prob_buf.ctypes.data % 64 == 0
+
+
+def test_single_out_of_range(compiled):
+    cir = make(3, compiled)
+    cir.h(0)
+    with pytest.raises(IndexError):
+        cir.h(9)    # apply_1q
+    with pytest.raises(IndexError):
+        cir.h([1, -1])
+    cir.h(0)
+    assert np.allclose(cir.state, [1, 0, 0, 0, 0, 0, 0, 0])
+
+
+def test_double_out_of_range(compiled):
+    cir = make(3, compiled)
+    cir.h(0)
+    with pytest.raises(IndexError):
+        cir.ch(0, 5)    # apply_2q
+    with pytest.raises(IndexError):
+        cir.crx(0.3, 3, 0)
+    with pytest.raises(ValueError):
+        cir.ch(1, 1)
+    assert np.isclose(np.linalg.norm(cir.state), 1.0)
+
+
+def test_fast_paths_out_of_range(compiled):
+    cir = make(3, compiled)
+    cir.h(0)
+    with pytest.raises(IndexError):
+        cir.x(3)    # apply_x
+    with pytest.raises(IndexError):
+        cir.t(9)    # apply_diag_1q
+    with pytest.raises(IndexError):
+        cir.cz(-1, 0)    # apply_diag_2q
+    with pytest.raises(IndexError):
+        cir.crz(0.3, 0, 3)
+    with pytest.raises(IndexError):
+        cir.cx(0, 4)    # apply_cx
+    with pytest.raises(ValueError):
+        cir.cz(2, 2)
+    with pytest.raises(ValueError):
+        cir.cx(2, 2)
+    assert np.isclose(np.linalg.norm(cir.state), 1.0)
+
+
+def test_swap_out_of_range(compiled):
+    cir = make(3, compiled)
+    cir.h(0)
+    with pytest.raises(IndexError):
+        cir.swap(0, 7)    # apply_swap
+    with pytest.raises(IndexError):
+        cir.swap(-1, 1)
+    cir.swap(1, 1)
+    assert np.isclose(np.linalg.norm(cir.state), 1.0)
+
+
+def test_state_assignment(compiled):
+    cir = make(2, compiled)
+    cir.state = np.array([1, 0, 0, 0.])
+    cir.h(0)
+    assert np.allclose(cir.state, [np.sqrt(0.5), 0, np.sqrt(0.5), 0])
+    assert cir.state.dtype == complex
+    assert cir.state.ctypes.data % 64 == 0
+    with pytest.raises(ValueError):
+        cir.state = np.zeros(8)
+
+
+def test_initialize_product_checks(compiled):
+    cir = make(2, compiled)
+    with pytest.raises(ValueError):
+        cir.initialize_product([[1, 0]])
+    with pytest.raises(ValueError):
+        cir.initialize_product([[1, 0, 0, 0]] * 2)
+    with pytest.raises(ValueError):
+        cir.initialize_product([[[1, 0]], [1, 0]])
+
+
+def test_array_angle(compiled):
+    cir = make(2, compiled)
+    cir.rx(np.array(0.3), 0)
+    cir.crz(np.float64(0.7), 0, 1)
+    ref = full_double(gate.crz_gate(0.7), 0, 1, 2) \
+        @ full_single(gate.rx_gate(0.3), 0, 2)
+    assert np.allclose(cir.state, ref[:, 0])
+    assert gate.ry_gate(np.array(0.3)) is gate.ry_gate(0.3)
+
+
+def test_measure_zero_state(compiled):
+    cir = make(2, compiled)
+    cir.initialize([0, 0, 0, 0])
+    with pytest.raises(ValueError):
+        cir.measure()